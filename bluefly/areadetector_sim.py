@@ -1,4 +1,5 @@
 import asyncio
+from typing import Dict
 
 import h5py
 import numpy as np
@@ -42,6 +43,8 @@ def sim_detector_logic(
     # The detector image we will modify for each image (0..255 range)
     blob = make_gaussian_blob(width, height) * 255
     hdf_file = None
+    # {path: dataset} for the open file
+    datasets: Dict[str, h5py.Dataset] = {}
     p.set_value(driver.array_size_x, width)
     p.set_value(driver.array_size_y, height)
 
@@ -54,15 +57,17 @@ def sim_detector_logic(
         nonlocal hdf_file
         hdf_file = h5py.File(file_path, "w", libver="latest")
         # Data written in a big stack, growing in that dimension
-        hdf_file.create_dataset(
+        # One chunk per frame, so each frame is written in one go
+        datasets[DATA_PATH] = hdf_file.create_dataset(
             DATA_PATH,
             dtype=np.uint8,
             shape=(1, height, width),
             maxshape=(None, height, width),
+            chunks=(1, height, width),
         )
         for path, dtype in {UID_PATH: np.int32, SUM_PATH: np.float64}.items():
             # Areadetector attribute datasets have the same dimesionality as the data
-            hdf_file.create_dataset(
+            datasets[path] = hdf_file.create_dataset(
                 path, dtype=dtype, shape=(1, 1, 1), maxshape=(None, 1, 1), fillvalue=-1
             )
         hdf_file.swmr_mode = True
@@ -85,28 +90,31 @@ def sim_detector_logic(
                 # Stop now
                 break
             uid = i + offset
-            # Resize the datasets so they fit
-            for path in (DATA_PATH, SUM_PATH, UID_PATH):
-                ds = hdf_file[path]
-                expand_to = tuple(max(*z) for z in zip((uid + 1, 1, 1), ds.shape))
-                ds.resize(expand_to)
+            # Grow the datasets to fit, like areaDetector does, but only touch
+            # them if this frame is past the end
+            for ds in datasets.values():
+                if ds.shape[0] <= uid:
+                    ds.resize(uid + 1, axis=0)
             intensity = interesting_pattern(
                 p.get_value(x.motor.readback), p.get_value(y.motor.readback)
             )
             detector_data = (blob * intensity * exposure / period).astype(np.uint8)
-            hdf_file[DATA_PATH][uid] = detector_data
-            hdf_file[UID_PATH][uid] = uid
-            hdf_file[SUM_PATH][uid] = np.sum(detector_data)
+            # Each frame is exactly one unfiltered chunk, so hand it straight
+            # to HDF5 rather than going through a hyperslab selection
+            datasets[DATA_PATH].id.write_direct_chunk((uid, 0, 0), detector_data)
+            datasets[UID_PATH][uid] = uid
+            datasets[SUM_PATH][uid] = np.sum(detector_data)
             p.set_value(hdf.array_counter, p.get_value(hdf.array_counter) + 1)
 
     @p.on_call(hdf.flush_now)
     async def do_hdf_flush():
         # Note that UID comes last so anyone monitoring knows the data is there
         for path in (DATA_PATH, SUM_PATH, UID_PATH):
-            hdf_file[path].flush()
+            datasets[path].flush()
 
     @p.on_call(hdf.stop)
     async def do_hdf_close():
+        datasets.clear()
         hdf_file.close()
 
     @p.on_call(driver.stop)
@@ -29,7 +29,6 @@ from typing import (
 )
 
 from bluesky.run_engine import get_bluesky_event_loop
-from scanpointgenerator import CompoundGenerator
 from scanpointgenerator.core.point import Point, Points
 
 # Would love to write this recursively, but I don't think you can
@@ -94,7 +93,8 @@ class Status(Generic[ValueT]):
             # Don't do this in __init__ as this has a performance hit
             self._awaitable = asyncio.create_task(self._awaitable)
             self._awaitable.add_done_callback(self._run_callbacks)
-        if self.done:
+        # We know it's a task now, so skip the checks in self.done
+        if self._awaitable.done():
             callback(self)
         else:
             self._callbacks.append(callback)
@@ -115,8 +115,11 @@ class Status(Generic[ValueT]):
             return True
 
     def _run_callbacks(self, task: Task):
+        # If cancelled, keep the callbacks for the task that resume() makes
         if not task.cancelled():
-            for callback in self._callbacks:
+            # Each callback only fires once, even if one of them adds another
+            callbacks, self._callbacks = self._callbacks, []
+            for callback in callbacks:
                 callback(self)
 
     def watch(self, watcher: Callable):
@@ -133,6 +136,9 @@ def _fail(*args, **kwargs):
 class Signal(ABC):
     """Signals are like ophyd Signals, but async"""
 
+    # Signals are made in large numbers, so let implementations use __slots__
+    __slots__ = ()
+
     source: str  # like ca://PV_PREFIX:SIGNAL or panda://172.23.252.201/PCAP/ARM
 
     @abstractmethod
@@ -145,6 +151,8 @@ class Signal(ABC):
 class SignalR(Signal, Generic[ValueT]):
     """Signal that can be read from and monitored"""
 
+    __slots__ = ()
+
     @abstractmethod
     async def get(self) -> ValueT:
         """The current value"""
@@ -160,6 +168,8 @@ class SignalR(Signal, Generic[ValueT]):
 class SignalW(Signal, Generic[ValueT]):
     """Signal that can be put to"""
 
+    __slots__ = ()
+
     @abstractmethod
     def set(self, value: ValueT) -> Status[ValueT]:
         """Send the value to the control system, returning a Status
@@ -169,10 +179,14 @@ class SignalW(Signal, Generic[ValueT]):
 class SignalRW(SignalR[ValueT], SignalW[ValueT]):
     """Signal that can be read from, monitored, and put to"""
 
+    __slots__ = ()
+
 
 class SignalX(Signal):
     """Signal that can be executed"""
 
+    __slots__ = ()
+
     @abstractmethod
     async def __call__(self):
         """Execute this"""
@@ -280,6 +294,33 @@ class _SingletonContextManager:
         return cast(InstanceT, cls._instance)
 
 
+# {HasSignals subclass: {attr_name: SignalDetails}}
+_signal_details_cache: Dict[type, Dict[str, SignalDetails]] = {}
+
+
+def _signal_details(obj_cls: type) -> Dict[str, SignalDetails]:
+    """Make channel details from the type hints of obj_cls. These are the same
+    for every instance, so only do it once per class"""
+    try:
+        return _signal_details_cache[obj_cls]
+    except KeyError:
+        pass
+    hints = get_type_hints(obj_cls)  # type: ignore
+    signal_sources = getattr(obj_cls, "__signal_sources__", {})
+    details: Dict[str, SignalDetails] = {}
+    # Look for all attributes with type hints
+    for attr_name, ann in hints.items():
+        try:
+            details[attr_name] = SignalDetails.from_annotation(
+                ann, signal_sources.get(attr_name, attr_name)
+            )
+        except TypeError:
+            # This isn't a Signal, don't make it
+            pass
+    _signal_details_cache[obj_cls] = details
+    return details
+
+
 class SignalCollector(_SingletonContextManager):
     """Collector of Signals from HasSignals instances to be used as a context manager:
 
@@ -332,20 +373,7 @@ class SignalCollector(_SingletonContextManager):
 
     @classmethod
     def make_signals(cls, obj: HasSignals, add_extra_signals: bool):
-        # Make channel details from the type
-        hints = get_type_hints(type(obj))  # type: ignore
-        signal_sources = getattr(obj, "__signal_sources__", {})
-        details: Dict[str, SignalDetails] = {}
-        # Look for all attributes with type hints
-        for attr_name, ann in hints.items():
-            try:
-                details[attr_name] = SignalDetails.from_annotation(
-                    ann, signal_sources.get(attr_name, attr_name)
-                )
-            except TypeError:
-                # This isn't a Signal, don't make it
-                pass
-
+        details = _signal_details(type(obj))
         if details or add_extra_signals:
             self = cls.get_instance()
             split = obj.signal_prefix.split("://", 1)
@@ -440,33 +468,36 @@ class SettableDevice(ReadableDevice):
 
 
 class RemainingPoints:
-    """CompoundGenerator prepared with progress indicator"""
+    """Points of a prepared CompoundGenerator with progress indicator"""
 
-    def __init__(self, spg: CompoundGenerator, completed: int):
-        self.spg = spg
+    def __init__(self, points: Points, duration: float, completed: int):
+        # All the points in the scan, calculated once at kickoff
+        self.points = points
+        self.duration = duration
         self.completed = completed
 
     def peek_point(self) -> Point:
-        return self.spg.get_point(self.completed)
+        return self.points[int(self.completed)]
 
     def get_points(self, num) -> Points:
-        new_completed = min(self.completed + num, self.spg.size)
-        points = self.spg.get_points(self.completed, new_completed)
+        new_completed = min(self.completed + num, self.size)
+        # Slicing gives views of the underlying arrays rather than copies
+        points = self.points[self.completed : new_completed]
         self.completed = new_completed
         return points
 
     @property
     def constant_duration(self) -> float:
-        assert self.spg.duration, "Scan point generator has variable duration"
-        return self.spg.duration
+        assert self.duration, "Scan point generator has variable duration"
+        return self.duration
 
     @property
     def remaining(self) -> int:
-        return self.spg.size - self.completed
+        return self.size - self.completed
 
     @property
     def size(self) -> int:
-        return self.spg.size
+        return len(self.points)
 
 
 class FilenameScheme(_SingletonContextManager, ABC):
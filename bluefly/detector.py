@@ -159,6 +159,7 @@ class DetectorDevice(ReadableDevice):
         self._watchers: List[Callable] = []
         self._factory: Optional[DatumFactory] = None
         self._scheme = FilenameScheme.get_instance()
+        self._unstage_task: Optional[asyncio.Task] = None
 
     def configure(self, d: Dict[str, Any]) -> Tuple[ConfigDict, ConfigDict]:
         old_config = self.read_configuration()
@@ -182,12 +183,18 @@ class DetectorDevice(ReadableDevice):
         return [self]
 
     def unstage(self) -> List[Device]:
-        asyncio.create_task(self._unstage())
+        # Keep a reference so the task isn't garbage collected before it runs
+        self._unstage_task = asyncio.create_task(self._unstage())
         return [self]
 
     async def _unstage(self):
         await asyncio.gather(self.logic.close(), self._scheme.done_using_prefix())
 
+    async def wait_for_unstage(self):
+        """Wait until the files that unstage() closes are closed"""
+        assert self._unstage_task, "Unstage not called"
+        await self._unstage_task
+
     @property
     def hints(self):
         assert self._factory, "Not triggered yet"
@@ -222,9 +229,9 @@ class DetectorDevice(ReadableDevice):
 
         async def update_watchers():
             for _ in range(int(self._exposure / 0.1) + 1):
-                for watcher in self._watchers:
+                if self._watchers:
                     elapsed = time.time() - start
-                    watcher(
+                    kwargs = dict(
                         name=self.name,
                         current=elapsed,
                         initial=0,
@@ -233,6 +240,8 @@ class DetectorDevice(ReadableDevice):
                         precision=3,
                         time_elapsed=elapsed,
                     )
+                    for watcher in self._watchers:
+                        watcher(**kwargs)
                 await asyncio.sleep(0.1)
 
         offset = self._factory.point_number
@@ -1,18 +1,62 @@
 import asyncio
+import functools
 import json
 import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, Generator, List, Optional, Sequence, Tuple
 
 import numpy as np
 from bluesky.run_engine import get_bluesky_event_loop
-from scanpointgenerator import CompoundGenerator
+from scanpointgenerator import CompoundGenerator, Points
 
 from bluefly import detector, motor, pmac
 from bluefly.core import ConfigDict, Device, RemainingPoints, Status
 from bluefly.detector import DatumFactory, DetectorDevice, FilenameScheme
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+
+def _dumps(obj: Any) -> str:
+    """Encode obj as a JSON string, using orjson if it is installed"""
+    if orjson is None:
+        # Compact to keep it short. This doesn't match orjson exactly: NaN,
+        # non-str keys and numpy values are all handled differently
+        return json.dumps(obj, separators=(",", ":"))
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+# Points are calculated in a single background thread so that big scans don't
+# block the event loop
+_generator_executor = ThreadPoolExecutor(max_workers=1)
+
+# Minimum time between progress updates to watchers of a fly scan
+WATCHER_UPDATE_PERIOD = 0.05
+
+
+@functools.lru_cache(maxsize=None)
+def _empty_generator_json() -> str:
+    """The configuration reported before a generator is configured. Made once
+    rather than making an empty CompoundGenerator for every FlyDevice"""
+    return _dumps(CompoundGenerator(generators=[]).to_dict())
+
+
+class _ProgressCallback:
+    """Put (name, steps + offset) on queue for each detector progress update"""
+
+    __slots__ = ("queue", "offset")
+
+    def __init__(self, queue: asyncio.Queue, offset: int):
+        self.queue = queue
+        self.offset = offset
+
+    def __call__(self, name: str, steps: int):
+        self.queue.put_nowait((name, steps + self.offset))
+
 
 class FlyLogic(ABC):
     @abstractmethod
@@ -42,16 +86,25 @@ class FlyDevice(Device):
         assert detectors, "Need at least one detector"
         self._detectors = detectors
         self._logic = logic
-        self._generator = CompoundGenerator(generators=[])
+        self._generator: Optional[CompoundGenerator] = None
+        self._generator_json = _empty_generator_json()
+        self._points: Optional[Points] = None
+        # The generator JSON that _points were calculated from
+        self._points_json: Optional[str] = None
         self._when_configured = time.time()
-        self._when_triggered = time.time()
-        self._when_updated = time.time()
+        # These are only used to measure elapsed time, so are monotonic
+        self._when_triggered = time.monotonic()
+        self._when_updated = time.monotonic()
         self._start_offset = 0
         self._completed_steps = 0
         self._total_steps = 0
         self._watchers: List[Callable] = []
         self._complete_status: Optional[Status] = None
         self._pause_task: Optional[asyncio.Task] = None
+        self._unstage_task: Optional[asyncio.Task] = None
+        self._scanning = False
+        # Only present while someone is in wait_for_collections()
+        self._collections_ready: Optional[asyncio.Event] = None
         self._factories: Dict[str, DatumFactory] = {}
         self._scheme = FilenameScheme.get_instance()
 
@@ -59,15 +112,14 @@ class FlyDevice(Device):
         old_config = self.read_configuration()
         self._when_configured = time.time()
         self._generator = d["generator"]
+        # Only encode when the generator changes, not on every read
+        self._generator_json = _dumps(self._generator.to_dict())
         new_config = self.read_configuration()
         return old_config, new_config
 
     def read_configuration(self) -> ConfigDict:
         return dict(
-            generator=dict(
-                value=json.dumps(self._generator.to_dict()),
-                timestamp=self._when_configured,
-            )
+            generator=dict(value=self._generator_json, timestamp=self._when_configured)
         )
 
     def describe_configuration(self) -> ConfigDict:
@@ -80,13 +132,19 @@ class FlyDevice(Device):
         return [self]
 
     def unstage(self) -> List[Device]:
-        asyncio.create_task(self._unstage())
+        # Keep a reference so the task isn't garbage collected before it runs
+        self._unstage_task = asyncio.create_task(self._unstage())
         return [self]
 
     async def _unstage(self):
         det_coros = [det.logic.close() for det in self._detectors]
         await asyncio.gather(self._scheme.done_using_prefix(), *det_coros)
 
+    async def wait_for_unstage(self):
+        """Wait until the files that unstage() closes are closed"""
+        assert self._unstage_task, "Unstage not called"
+        await self._unstage_task
+
     @property
     def hints(self):
         return dict(fields=[f.summary_name for f in self._factories.values()])
@@ -94,14 +152,27 @@ class FlyDevice(Device):
     def collect(self) -> Generator[Dict[str, ConfigDict], None, None]:
         for factory in self._factories.values():
             for datum in factory.collect_datums():
-                # this is horrible, write it better
-                point = self._generator.get_point(datum.pop("point_number"))
+                assert self._points is not None, "Kickoff not called"
+                point = self._points[datum.pop("point_number")]
+                now = time.time()
                 for p, v in point.positions.items():
                     datum["data"][p] = v
                     datum["filled"][p] = True
-                    datum["timestamps"][p] = time.time()
+                    datum["timestamps"][p] = now
                 yield datum
 
+    async def wait_for_collections(self):
+        """Wait until there are new points for collect(), or the scan stops"""
+        if self._scanning:
+            if self._collections_ready is None:
+                self._collections_ready = asyncio.Event()
+            await self._collections_ready.wait()
+
+    def _wake_collectors(self):
+        event, self._collections_ready = self._collections_ready, None
+        if event:
+            event.set()
+
     def collect_asset_docs(self):
         for factory in self._factories.values():
             yield from factory.collect_asset_docs()
@@ -110,7 +181,7 @@ class FlyDevice(Device):
         d = {}
         for factory in self._factories.values():
             d.update(factory.describe())
-        for axis in self._generator.axes:
+        for axis in self._generator.axes if self._generator else []:
             d[axis] = dict(source=axis, dtype="number", shape=[])
         return dict(primary=d)
 
@@ -120,9 +191,16 @@ class FlyDevice(Device):
 
     async def _kickoff(self):
         self._completed_steps = 0
-        self._generator.prepare()
-        self._total_steps = self._generator.size
-        self._when_triggered = time.time()
+        # Calculate all the points up front, then hand out slices of them. This
+        # can take a while for big scans, so don't block the event loop, and
+        # don't do it again if the next scan has the same generator
+        if self._points is None or self._points_json != self._generator_json:
+            self._points = await asyncio.get_running_loop().run_in_executor(
+                _generator_executor, self._calculate_points
+            )
+            self._points_json = self._generator_json
+        self._total_steps = len(self._points)
+        self._when_triggered = time.monotonic()
         if not self._factories:
             # beginning of the scan, open the file
             self._start_offset = 0
@@ -136,10 +214,26 @@ class FlyDevice(Device):
                 assert det.name
                 self._factories[det.name] = DatumFactory(det.name, resource)
 
+    def _calculate_points(self) -> Points:
+        assert self._generator, "Configure not called"
+        self._generator.prepare()
+        return self._generator.get_points(0, self._generator.size)
+
     def pause(self):
         assert self._complete_status, "Complete not called"
-        self._complete_status.task.cancel()
-        self._pause_task = asyncio.create_task(self._logic.stop(self._detectors))
+        task = self._complete_status.task
+        task.cancel()
+        self._pause_task = asyncio.create_task(self._pause(task))
+
+    async def _pause(self, task: asyncio.Task):
+        # Let the scan finish unwinding before we stop the hardware under it
+        await asyncio.wait([task])
+        await self._logic.stop(self._detectors)
+
+    async def wait_for_pause(self):
+        """Wait until pause() has stopped the hardware, so it can be resumed"""
+        assert self._pause_task, "Pause not called"
+        await self._pause_task
 
     def resume(self):
         assert self._complete_status.task.cancelled(), "You didn't call pause"
@@ -155,7 +249,10 @@ class FlyDevice(Device):
 
     async def _complete(self):
         completed_at_start = self._completed_steps
-        points = RemainingPoints(self._generator, completed_at_start)
+        assert self._points is not None, "Kickoff not called"
+        points = RemainingPoints(
+            self._points, self._generator.duration, completed_at_start
+        )
         queue: asyncio.Queue[int] = asyncio.Queue()
 
         async def update_watchers():
@@ -165,41 +262,89 @@ class FlyDevice(Device):
             last_updated: Dict[str, float] = {
                 det.name: time.time() for det in self._detectors
             }
+            last_notified, last_percent = -np.inf, -1
+            # Sends progress that was held back, if no later update does first
+            trailing: Optional[asyncio.TimerHandle] = None
 
-            while self._completed_steps < self._total_steps:
-                oldest_det = time.time() - min(last_updated.values())
-                # Allow the oldest detector to be up to 60s + exposure behind
-                timeout = 60 + self._generator.duration - oldest_det
-                name, step = await asyncio.wait_for(queue.get(), timeout)
-                factory = self._factories[name]
-                factory.register_collections(np.arange(steps[name], step))
-                steps[name] = step
-                new_completed_steps = min(steps.values())
-                if new_completed_steps > self._completed_steps:
-                    self._completed_steps = new_completed_steps
-                    self._when_updated = time.time()
-                    for watcher in self._watchers:
-                        watcher(
-                            name=self.name,
-                            current=self._completed_steps,
-                            initial=0,
-                            target=self._total_steps,
-                            unit="",
-                            precision=0,
-                            time_elapsed=self._when_updated - self._when_triggered,
-                        )
+            def notify_watchers():
+                nonlocal last_notified, last_percent, trailing
+                if trailing:
+                    trailing.cancel()
+                    trailing = None
+                last_notified = time.monotonic()
+                last_percent = self._completed_steps * 100 // self._total_steps
+                kwargs = dict(
+                    name=self.name,
+                    current=self._completed_steps,
+                    initial=0,
+                    target=self._total_steps,
+                    unit="",
+                    precision=0,
+                    time_elapsed=self._when_updated - self._when_triggered,
+                )
+                for watcher in self._watchers:
+                    watcher(**kwargs)
 
-        await asyncio.gather(
-            self._logic.scan(
-                self._detectors,
-                points,
-                self._start_offset + self._completed_steps,
-                lambda name, steps: queue.put_nowait(
-                    (name, steps + completed_at_start)
+            try:
+                while self._completed_steps < self._total_steps:
+                    oldest_det = time.time() - min(last_updated.values())
+                    # Allow the oldest detector to be up to 60s + exposure behind
+                    timeout = 60 + self._generator.duration - oldest_det
+                    updates = [await asyncio.wait_for(queue.get(), timeout)]
+                    # Drain anything else that arrived so watchers are only
+                    # called once per burst. Check empty() rather than catching
+                    # QueueEmpty so we don't raise at the end of every drain
+                    while not queue.empty():
+                        updates.append(queue.get_nowait())
+                    for name, step in updates:
+                        factory = self._factories[name]
+                        factory.register_collections(np.arange(steps[name], step))
+                        steps[name] = step
+                    self._wake_collectors()
+                    new_completed_steps = min(steps.values())
+                    if new_completed_steps > self._completed_steps:
+                        self._completed_steps = new_completed_steps
+                        self._when_updated = now = time.monotonic()
+                        if not self._watchers:
+                            # Nobody is watching, so don't build the kwargs
+                            continue
+                        # Fast scans can complete points far quicker than
+                        # anyone can watch them, so limit updates to 20Hz and
+                        # to when the percentage complete changes, except for
+                        # the last one
+                        percent = self._completed_steps * 100 // self._total_steps
+                        if self._completed_steps < self._total_steps:
+                            if percent == last_percent:
+                                # Nothing new to show, so drop it
+                                continue
+                            wait = last_notified + WATCHER_UPDATE_PERIOD - now
+                            if wait > 0:
+                                # Send the latest progress when the period is up
+                                if trailing is None:
+                                    trailing = asyncio.get_running_loop().call_later(
+                                        wait, notify_watchers
+                                    )
+                                continue
+                        notify_watchers()
+            finally:
+                # Don't leave watchers showing old progress if we stop early
+                if trailing:
+                    notify_watchers()
+
+        self._scanning = True
+        try:
+            await asyncio.gather(
+                self._logic.scan(
+                    self._detectors,
+                    points,
+                    self._start_offset + self._completed_steps,
+                    _ProgressCallback(queue, completed_at_start),
                 ),
-            ),
-            update_watchers(),
-        )
+                update_watchers(),
+            )
+        finally:
+            self._scanning = False
+            self._wake_collectors()
         self._start_offset += self._total_steps
 
 
@@ -33,9 +33,15 @@ class MotorDevice(SettableDevice):
         self.motor = motor
         self._trigger_task: Optional[asyncio.Task[float]] = None
         self._set_success = True
+        self._stop_task: Optional[asyncio.Task] = None
 
     def trigger(self) -> Status[float]:
-        self._trigger_task = asyncio.create_task(self.motor.readback.get())
+        # If a readback is still in flight from a previous trigger, share it
+        # rather than creating another task
+        if self._trigger_task is None or self._trigger_task.done():
+            # With an eager task factory this may already be done, which is fine
+            # as read() only asks for the result later
+            self._trigger_task = asyncio.create_task(self.motor.readback.get())
         return Status(self._trigger_task)
 
     def read(self) -> ConfigDict:
@@ -54,35 +60,54 @@ class MotorDevice(SettableDevice):
     def set(self, new_position: float, timeout: float = None) -> Status[float]:
         start = time.time()
         watchers: List[Callable] = []
+        watched = asyncio.Event()
+
+        def add_watcher(watcher: Callable):
+            watchers.append(watcher)
+            watched.set()
 
         async def update_watchers(old_position):
+            # Don't observe the readback until someone is watching
+            await watched.wait()
             units, precision = await asyncio.gather(
                 self.motor.egu.get(), self.motor.precision.get()
             )
+            # This loop runs at the readback rate, so look these up once
+            name, get_time = self.name, time.time
             async for current_position in self.motor.readback.observe():
+                kwargs = dict(
+                    name=name,
+                    current=current_position,
+                    initial=old_position,
+                    target=new_position,
+                    unit=units,
+                    precision=precision,
+                    time_elapsed=get_time() - start,
+                )
                 for watcher in watchers:
-                    watcher(
-                        name=self.name,
-                        current=current_position,
-                        initial=old_position,
-                        target=new_position,
-                        unit=units,
-                        precision=precision,
-                        time_elapsed=time.time() - start,
-                    )
+                    watcher(**kwargs)
 
         async def do_set():
             old_position = await self.motor.demand.get()
-            t = asyncio.create_task(update_watchers(old_position))
+            # If we aren't going to move there is nothing to watch
+            t = None
+            if old_position != new_position:
+                t = asyncio.create_task(update_watchers(old_position))
             await self.motor.demand.set(new_position)
-            t.cancel()
+            if t:
+                t.cancel()
             if not self._set_success:
                 raise RuntimeError("Motor was stopped")
 
         self._set_success = True
-        status = Status(asyncio.wait_for(do_set(), timeout=timeout), watchers.append)
+        if timeout is None:
+            # No need for wait_for to schedule a timer that will never fire
+            status = Status(do_set(), add_watcher)
+        else:
+            status = Status(asyncio.wait_for(do_set(), timeout=timeout), add_watcher)
         return status
 
     def stop(self, *, success=False):
         self._set_success = success
-        asyncio.create_task(self.motor.stop())
+        # Keep a reference so the task isn't garbage collected before it runs
+        self._stop_task = asyncio.create_task(self.motor.stop())
@@ -1,5 +1,7 @@
 import asyncio
 
+import numpy as np
+
 from bluefly.motor import MotorDevice
 from bluefly.simprovider import SimProvider
 
@@ -23,9 +25,14 @@ def sim_motor_logic(
             velocity = p.get_value(mr.velocity)
             # Don't try to be clever, just move at a constant velocity
             move_time = (new_position - old_position) / velocity
-            for i in range(int(move_time / 0.1)):
-                p.set_value(mr.readback, old_position + i * 0.1 * velocity)
-                await asyncio.sleep(0.1)
+            positions = old_position + np.arange(int(move_time / 0.1)) * 0.1 * velocity
+            loop = asyncio.get_running_loop()
+            # Sleep until absolute deadlines so time doesn't drift during the move
+            deadline = loop.time()
+            for position in positions.tolist():
+                p.set_value(mr.readback, position)
+                deadline += 0.1
+                await asyncio.sleep(deadline - loop.time())
             p.set_value(mr.readback, new_position)
             p.set_value(mr.done_move, 1)
 
@@ -1,6 +1,6 @@
 import asyncio
-from dataclasses import dataclass
-from typing import Dict, Sequence, Set, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence, Set, Tuple
 
 import numpy as np
 from scanpointgenerator import Point
@@ -34,6 +34,8 @@ class PMACCoord(HasSignals):
     use={x: f"use_{x}" for x in CS_AXES},
 )
 class PMACTrajectory(HasSignals):
+    # These are set with contiguous numpy arrays, float64 apart from int32
+    # user_programs, so providers can send them without converting them
     times: SignalW[Sequence[float]]
     velocity_modes: SignalW[Sequence[float]]
     user_programs: SignalW[Sequence[int]]
@@ -56,10 +58,14 @@ class PMACTrajectory(HasSignals):
 
 
 class PMAC:
-    def __init__(self, pv_prefix: str):
+    def __init__(self, pv_prefix: str, batch_size: Optional[int] = None):
         self.pv_prefix = pv_prefix
+        # Points sent to the trajectory per put, BATCH_SIZE if not given
+        self.batch_size = batch_size
         self.cs_list = [PMACCoord(f"{pv_prefix}CS{i+1}") for i in range(16)]
         self.traj = PMACTrajectory(f"{pv_prefix}TRAJ")
+        # {cs_port: PMACCoord} filled in by find_cs()
+        self.cs_for_port: Dict[str, PMACCoord] = {}
 
 
 class PMACCompoundMotor(MotorRecord):
@@ -71,6 +77,8 @@ class PMACRawMotor(MotorRecord):
     cs_port: SignalR[str]
 
 
+# Default number of points per trajectory batch. Bigger batches mean fewer
+# round trips, but each must fit in the trajectory IOC's waveform buffers
 BATCH_SIZE = 100
 
 
@@ -86,49 +94,102 @@ class TrajectoryBatch:
 class TrajectoryTracker:
     points: RemainingPoints
     cs_axes: Dict[str, str]
+    batch_size: int
+    # Which CS axes the scan moves, this doesn't change between batches
+    use: Dict[str, bool] = field(init=False)
+    # The CS axis for each axis of points, in the order points gives them
+    _renamed_axes: Tuple[str, ...] = field(init=False)
+    # Velocity modes and user programs are always zero, so every batch shares
+    # read-only views of these rather than allocating new arrays
+    _zeros: np.ndarray = field(init=False)
+    _int_zeros: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self._renamed_axes = tuple(
+            self.cs_axes[axis] for axis in self.points.points.positions
+        )
+        self.use = {x: x in self._renamed_axes for x in CS_AXES}
+        self._zeros = np.zeros(self.batch_size)
+        self._int_zeros = np.zeros(self.batch_size, dtype=np.int32)
+        self._zeros.flags.writeable = False
+        self._int_zeros.flags.writeable = False
 
     def ready_for_next_batch(self, step: int):
-        return self.points.remaining and self.points.completed < step + BATCH_SIZE
+        return self.points.remaining and self.points.completed < step + self.batch_size
 
     def get_next_batch(self) -> TrajectoryBatch:
-        points = self.points.get_points(BATCH_SIZE)
+        points = self.points.get_points(self.batch_size)
+        n = len(points)
+        # Slices of the precomputed positions, like times below. They belong
+        # to this batch alone, so a value already set on a signal never changes
+        positions = {}
+        for cs_axis, values in zip(self._renamed_axes, points.positions.values()):
+            if not values.flags.c_contiguous or values.dtype != np.float64:
+                values = np.ascontiguousarray(values, dtype=np.float64)
+            positions[cs_axis] = values
+        # A slice of the precomputed durations, so this is already contiguous
+        # float64 unless the generator gave us something odd
+        times = points.duration
+        if not times.flags.c_contiguous or times.dtype != np.float64:
+            times = np.ascontiguousarray(times, dtype=np.float64)
         return TrajectoryBatch(
-            times=points.duration,
-            velocity_modes=np.zeros(len(points)),
-            user_programs=np.zeros(len(points)),
-            positions={self.cs_axes[k]: v for k, v in points.positions.items()},
+            times=times,
+            velocity_modes=self._zeros[:n],
+            user_programs=self._int_zeros[:n],
+            positions=positions,
         )
 
 
 async def get_cs(motors: Sequence[MotorDevice]) -> Tuple[str, Dict[str, str]]:
-    cs_ports: Set[str] = set()
-    cs_axes: Dict[str, str] = {}
+    raw_motors: Dict[str, PMACRawMotor] = {}
     for sm in motors:
         assert sm.name
         motor = sm.motor
         if isinstance(motor, PMACRawMotor):
-            cs_ports.add(await motor.cs_port.get())
-            cs_axes[sm.name] = (await motor.cs_axis.get()).lower()
+            raw_motors[sm.name] = motor
         else:
             raise NotImplementedError("Not handled PMAC compound motor yet")
+    # Get all the ports and axes at once rather than a round trip per motor
+    n = len(raw_motors)
+    results = await asyncio.gather(
+        *[m.cs_port.get() for m in raw_motors.values()],
+        *[m.cs_axis.get() for m in raw_motors.values()],
+    )
+    cs_ports: Set[str] = set(results[:n])
+    cs_axes = {name: axis.lower() for name, axis in zip(raw_motors, results[n:])}
     cs_ports_list = sorted(cs_ports)
     assert len(cs_ports_list) == 1, f"Expected one CS, got {cs_ports_list}"
     return cs_ports_list[0], cs_axes
 
 
+async def find_cs(pmac: PMAC, cs_port: str) -> PMACCoord:
+    cs = pmac.cs_for_port.get(cs_port)
+    # CS can be reassigned or the IOC restarted, so check the one we found
+    # last time is still right, then ask all the CS again if it isn't
+    if cs is None or await cs.port.get() != cs_port:
+        pmac.cs_for_port.clear()
+        # Ask all the CS at once rather than one at a time
+        ports = await asyncio.gather(
+            *[cs.port.get() for cs in pmac.cs_list], return_exceptions=True
+        )
+        for cs, port in zip(pmac.cs_list, ports):
+            if isinstance(port, NotConnectedError):
+                # Some CS are not implemented for all PMACs
+                continue
+            elif isinstance(port, BaseException):
+                raise port
+            pmac.cs_for_port.setdefault(port, cs)
+    try:
+        return pmac.cs_for_port[cs_port]
+    except KeyError:
+        raise ValueError(f"No CS given for {cs_port!r}")
+
+
 async def move_to_start(
     pmac: PMAC, motors: Sequence[MotorDevice], first_point: Point,
 ):
     cs_port, cs_axes = await get_cs(motors)
-    for cs in pmac.cs_list:
-        try:
-            if await cs.port.get() == cs_port:
-                break
-        except NotConnectedError:
-            # Some CS are not implemented for all PMACs
-            continue
-    else:
-        raise ValueError(f"No CS given for {cs_port!r}")
+    cs = await find_cs(pmac, cs_port)
     await cs.defer_moves.set(True)
     # insert real axis run-up calcs here
     demands = {cs_axes[axis]: value for axis, value in first_point.positions.items()}
@@ -141,45 +202,62 @@ async def check_traj_success(status, message):
         raise ValueError(await message.get())
 
 
+async def push_batch(traj: PMACTrajectory, batch: TrajectoryBatch):
+    await asyncio.gather(
+        traj.times.set(batch.times),
+        traj.user_programs.set(batch.user_programs),
+        traj.velocity_modes.set(batch.velocity_modes),
+        traj.positions.set(batch.positions),
+        traj.points_to_build.set(len(batch.times)),
+    )
+
+
 async def build_initial_trajectory(
     pmac: PMAC, motors: Sequence[MotorDevice], points: RemainingPoints,
 ) -> TrajectoryTracker:
     cs_port, cs_axes = await get_cs(motors)
     traj = pmac.traj
-    await traj.cs.set(cs_port)
-    tracker = TrajectoryTracker(points, cs_axes)
+    tracker = TrajectoryTracker(points, cs_axes, pmac.batch_size or BATCH_SIZE)
     batch = tracker.get_next_batch()
+    # Which CS and axes are used doesn't change between batches, so only set
+    # them here, along with the first batch
     await asyncio.gather(
-        traj.times.set(batch.times),
-        traj.user_programs.set(batch.user_programs),
-        traj.velocity_modes.set(batch.velocity_modes),
-        traj.positions.set(batch.positions),
-        traj.points_to_build.set(len(batch.times)),
-        traj.use.set({x: x in batch.positions for x in CS_AXES}),
+        traj.cs.set(cs_port), traj.use.set(tracker.use), push_batch(traj, batch)
     )
     await traj.build()
     await check_traj_success(traj.build_status, traj.build_message)
     return tracker
 
 
+async def wait_for_refill(traj: PMACTrajectory, tracker: TrajectoryTracker):
+    """Return when points_scanned shows the trajectory needs another batch"""
+    async for step in traj.points_scanned.observe():
+        if tracker.ready_for_next_batch(step):
+            return
+
+
 async def keep_filling_trajectory(pmac: PMAC, tracker: TrajectoryTracker):
     traj = pmac.traj
     task = asyncio.create_task(traj.execute())
-    async for step in traj.points_scanned.observe():
+    while tracker.points.remaining:
+        # Only wake up when a new batch is needed or the scan has finished
+        refill = asyncio.create_task(wait_for_refill(traj, tracker))
+        try:
+            await asyncio.wait([task, refill], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            refill.cancel()
+        if refill.done():
+            # Raise any error from watching points_scanned
+            refill.result()
         if task.done():
             break
-        if tracker.ready_for_next_batch(step):
-            # Push a new batch of points
-            batch = tracker.get_next_batch()
-            await asyncio.gather(
-                traj.times.set(batch.times),
-                traj.user_programs.set(batch.user_programs),
-                traj.velocity_modes.set(batch.velocity_modes),
-                traj.positions.set(batch.positions),
-                traj.points_to_build.set(len(batch.times)),
-            )
-            await traj.append()
-            await check_traj_success(traj.append_status, traj.append_message)
+        # Push a new batch of points
+        await push_batch(traj, tracker.get_next_batch())
+        await traj.append()
+        await check_traj_success(traj.append_status, traj.append_message)
+    # Use wait rather than await so that cancelling us doesn't cancel execute,
+    # stop_trajectory() will abort it instead
+    await asyncio.wait([task])
     await check_traj_success(traj.execute_status, traj.execute_message)
 
 
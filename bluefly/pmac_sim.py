@@ -1,5 +1,5 @@
 import asyncio
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from bluefly.motor import MotorDevice
 from bluefly.pmac import CS_AXES, PMACRawMotor, PMACTrajectory
@@ -8,7 +8,8 @@ from bluefly.simprovider import SimProvider
 
 def sim_trajectory_logic(p: SimProvider, traj: PMACTrajectory, **motors: MotorDevice):
     """Just enough of a sim to make points_scanned tick at the right rate"""
-    stopping = asyncio.Event()
+    # Made by each scan, resolved by abort
+    stopped: Optional[asyncio.Future] = None
     times: List[float] = []
     positions: Dict[str, List[float]] = {}
 
@@ -19,40 +20,49 @@ def sim_trajectory_logic(p: SimProvider, traj: PMACTrajectory, **motors: MotorDe
 
     @p.on_call(traj.abort)
     async def do_abort():
-        stopping.set()
+        if stopped and not stopped.done():
+            stopped.set_result(None)
         times.clear()
         positions.clear()
 
     @p.on_call(traj.build)
     @p.on_call(traj.append)
     async def do_build_append():
-        for t in p.get_value(traj.times):
-            times.append(t)
+        times.extend(p.get_value(traj.times))
         for cs_axis, ps in p.get_value(traj.positions).items():
-            for pp in ps:
-                positions.setdefault(cs_axis, []).append(pp)
+            positions.setdefault(cs_axis, []).extend(ps)
         p.set_value(traj.build_status, "Success")
         p.set_value(traj.append_status, "Success")
 
     @p.on_call(traj.execute)
     async def do_scan():
         # Do a fake scan that takes the right time
-        stopping.clear()
+        nonlocal stopped
         status = "Success"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        # Wait on a bare future rather than an Event so there is no task to
+        # make, and schedule each point from the start of the scan so that
+        # time spent here doesn't add up. Iterate over times directly as
+        # append adds to it while we scan
+        stopped = loop.create_future()
+        # The axes in use are fixed by build, so work out what to move once
+        moves = [
+            (motors[cs_axis].motor.readback, positions[cs_axis])
+            for cs_axis, use in p.get_value(traj.use).items()
+            if use and cs_axis in motors
+        ]
+        set_value, points_scanned = p.set_value, traj.points_scanned
         for i, t in enumerate(times):
-            for cs_axis, use in p.get_value(traj.use).items():
-                if use and cs_axis in motors:
-                    p.set_value(motors[cs_axis].motor.readback, positions[cs_axis][i])
-            try:
-                # See if we got told to stop
-                await asyncio.wait_for(stopping.wait(), t)
-            except asyncio.TimeoutError:
-                # Carry on
-                p.set_value(traj.points_scanned, i + 1)
-            else:
+            for readback, axis_positions in moves:
+                set_value(readback, axis_positions[i])
+            deadline += t
+            await asyncio.wait([stopped], timeout=deadline - loop.time())
+            if stopped.done():
                 # Stop
                 status = "Aborted"
                 break
+            set_value(points_scanned, i + 1)
         times.clear()
         positions.clear()
         p.set_value(traj.execute_status, status)
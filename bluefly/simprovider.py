@@ -2,7 +2,16 @@ from __future__ import annotations
 
 import asyncio
 import collections.abc
-from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Mapping, TypeVar
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    Mapping,
+    Optional,
+    TypeVar,
+)
 
 from .core import (
     AwaitableSignals,
@@ -21,48 +30,56 @@ SetCallback = Callable[[Any], Awaitable[None]]
 CallCallback = Callable[[], Awaitable[None]]
 
 
-class _SimStore:
-    def __init__(self):
-        self.on_set: Dict[int, SetCallback] = {}
-        self.on_call: Dict[int, CallCallback] = {}
-        self.values: Dict[int, Any] = {}
-        self.events: Dict[int, asyncio.Event] = {}
-
-    def set_value(self, signal_id: int, value):
-        self.values[signal_id] = value
-        self.events[signal_id].set()
-        self.events[signal_id] = asyncio.Event()
-
-
 class SimSignal(Signal):
-    def __init__(self, source: str, store: _SimStore):
+    __slots__ = ("source", "_value", "_changed")
+
+    def __init__(self, source: str):
         self.source = source
-        self._store = store
+        # Signals can't be dict keys, so keep the value here rather than in a
+        # dict keyed on id(signal) that would outlive it
+        self._value: Any = None
+        # Only present while an observer is waiting for the next change
+        self._changed: Optional[asyncio.Event] = None
 
     async def connected(self) -> bool:
         return True
 
+    def _set_value(self, value):
+        self._value = value
+        # Wake any observers. Further changes before they run don't need another
+        # Event, as the observers will read the latest value when they wake
+        event, self._changed = self._changed, None
+        if event:
+            event.set()
+
 
 class SimSignalR(SignalR[ValueT], SimSignal):
+    __slots__ = ()
+
     async def get(self) -> ValueT:
-        return self._store.values[id(self)]
+        return self._value
 
     async def observe(self) -> AsyncGenerator[ValueT, None]:
-        id_self = id(self)
         while True:
-            yield self._store.values[id_self]
-            await self._store.events[id_self].wait()
+            yield self._value
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            await self._changed.wait()
 
 
 class SimSignalW(SignalW[ValueT], SimSignal):
     """Signal that can be put to"""
 
+    __slots__ = ("_on_set",)
+
+    def __init__(self, source: str):
+        super().__init__(source)
+        self._on_set: Optional[SetCallback] = None
+
     async def _do_set(self, value):
-        id_self = id(self)
-        cb = self._store.on_set.get(id_self, None)
-        if cb:
-            await cb(value)
-        self._store.set_value(id_self, value)
+        if self._on_set:
+            await self._on_set(value)
+        self._set_value(value)
         return value
 
     def set(self, value: ValueT) -> Status[ValueT]:
@@ -70,14 +87,19 @@ class SimSignalW(SignalW[ValueT], SimSignal):
 
 
 class SimSignalRW(SimSignalR[ValueT], SimSignalW[ValueT], SignalRW[ValueT]):
-    pass
+    __slots__ = ()
 
 
 class SimSignalX(SignalX, SimSignal):
+    __slots__ = ("_on_call",)
+
+    def __init__(self, source: str):
+        super().__init__(source)
+        self._on_call: Optional[CallCallback] = None
+
     async def __call__(self):
-        cb = self._store.on_call.get(id(self), None)
-        if cb:
-            await cb()
+        if self._on_call:
+            await self._on_call()
 
 
 lookup = {
@@ -88,33 +110,59 @@ lookup = {
 }
 
 
+# {value_type: function returning its default value}
+_default_factories: Dict[Any, Callable[[], Any]] = {}
+
+
+def _default_factory(value_type) -> Callable[[], Any]:
+    """Return a function that makes the default value for value_type. Cached as
+    many signals share the same handful of types"""
+    factory = _default_factories.get(value_type, None)
+    if factory is None:
+        origin = getattr(value_type, "__origin__", None)
+        if origin is None:
+            # str, bool, int, float
+            factory = value_type
+        elif origin is collections.abc.Sequence:
+            # Sequence[...]
+            factory = tuple
+        elif origin is dict:
+            # Dict[...]
+            factory = dict
+        else:
+            raise ValueError(f"Can't make {value_type}")
+        _default_factories[value_type] = factory
+    return factory
+
+
 SetCallbackT = TypeVar("SetCallbackT", bound=SetCallback)
 CallCallbackT = TypeVar("CallCallbackT", bound=CallCallback)
 
 
 class SimProvider(SignalProvider):
-    def __init__(self):
-        self._store = _SimStore()
-
     def on_set(self, signal: SignalW) -> Callable[[SetCallbackT], SetCallbackT]:
         def decorator(cb: SetCallbackT) -> SetCallbackT:
-            self._store.on_set[id(signal)] = cb
+            assert isinstance(signal, SimSignalW), f"{signal} is not a SimSignalW"
+            signal._on_set = cb
             return cb
 
         return decorator
 
     def on_call(self, signal: SignalX) -> Callable[[CallCallbackT], CallCallbackT]:
         def decorator(cb: CallCallbackT) -> CallCallbackT:
-            self._store.on_call[id(signal)] = cb
+            assert isinstance(signal, SimSignalX), f"{signal} is not a SimSignalX"
+            signal._on_call = cb
             return cb
 
         return decorator
 
     def get_value(self, signal: SignalR[ValueT]) -> ValueT:
-        return self._store.values[id(signal)]
+        assert isinstance(signal, SimSignal), f"{signal} is not a SimSignal"
+        return signal._value
 
     def set_value(self, signal: SignalR[ValueT], value: ValueT) -> ValueT:
-        self._store.set_value(id(signal), value)
+        assert isinstance(signal, SimSignal), f"{signal} is not a SimSignal"
+        signal._set_value(value)
         return value
 
     async def _connect_signals(
@@ -124,26 +172,14 @@ class SimProvider(SignalProvider):
         # then use the json contained in it to connect to all the
         # channels
         signals = {}
+        prefix = box_id + "."
         for attr_name, d in details.items():
             signal_cls = lookup[d.signal_cls]
-            signal = signal_cls(f"{box_id}.{attr_name}", self._store)
+            signal = signal_cls(prefix + attr_name)
             if isinstance(signal, (SimSignalR, SimSignalW)):
                 # Need a value
-                origin = getattr(d.value_type, "__origin__", None)
-                if origin is None:
-                    # str, bool, int, float
-                    assert d.value_type
-                    value = d.value_type()
-                elif origin is collections.abc.Sequence:
-                    # Sequence[...]
-                    value = ()
-                elif origin is dict:
-                    # Dict[...]
-                    value = origin()
-                else:
-                    raise ValueError(f"Can't make {d.value_type}")
-                self._store.values[id(signal)] = value
-                self._store.events[id(signal)] = asyncio.Event()
+                assert d.value_type, f"No value type for {attr_name}"
+                signal._set_value(_default_factory(d.value_type)())
             signals[attr_name] = signal
         return signals
 
@@ -0,0 +1,11 @@
+import asyncio
+import sys
+
+if sys.platform != "win32":
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        # Run the tests on the libuv based event loop if it is installed
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
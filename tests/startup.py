@@ -1,4 +1,5 @@
 import asyncio
+import os
 
 import bluesky.plan_stubs as bps
 import bluesky.plans as bp
@@ -23,17 +24,29 @@ from bluefly import (
 from bluefly.core import NamedDevices, SignalCollector, TmpFilenameScheme
 from bluefly.simprovider import SimProvider
 
+try:
+    import uvloop
+except ImportError:
+    pass
+else:
+    # Use the libuv based event loop for the RunEngine if it is installed
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
 RE = RunEngine({})
 asyncio.set_event_loop(get_bluesky_event_loop())
+if hasattr(asyncio, "eager_task_factory"):
+    # Python >= 3.12 can run new tasks synchronously until they first block
+    get_bluesky_event_loop().set_task_factory(asyncio.eager_task_factory)
 
 bec = BestEffortCallback()
 
 # Send all metadata/data captured to the BestEffortCallback.
 RE.subscribe(bec)
 
-# Make plots update live while scans run.
-install_kicker()
-get_ipython().magic("matplotlib qt")
+# Make plots update live while scans run, unless there's no GUI to update
+if get_ipython() is not None and not os.environ.get("BLUEFLY_HEADLESS"):
+    install_kicker()
+    get_ipython().magic("matplotlib qt")
 
 # Create a databroker backed by temporary files
 db = Broker.named("mycat")
@@ -111,11 +124,14 @@ def grid_fly(flyer, y, ystart, ystop, ynum, x, xstart, xstop, xnum):
     yield from bps.kickoff(flyer, wait=True)
     yield from bps.collect(flyer, stream=True)
     yield from bps.checkpoint()
-    yield from bps.complete(flyer, group="flyer")
-    for _ in range(int(ynum * xnum * 0.1)):
-        yield from bps.sleep(1)
+    status = yield from bps.complete(flyer, group="flyer")
+    while not status.done:
+        # Collect when new points are written rather than polling, but at most
+        # once a second so fast detectors don't flood the RunEngine
+        yield from bps.wait_for([flyer.wait_for_collections])
         yield from bps.collect(flyer, stream=True)
         yield from bps.checkpoint()
+        yield from bps.sleep(1)
     yield from bps.wait(group="flyer")
     yield from bps.collect(flyer, stream=True)
     yield from bps.close_run()
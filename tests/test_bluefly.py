@@ -1,7 +1,7 @@
 import asyncio
 import os
 import time
-from unittest.mock import ANY, Mock, call, patch
+from unittest.mock import ANY, AsyncMock, Mock, call, patch
 
 import h5py
 import numpy as np
@@ -19,7 +19,15 @@ from bluefly import (
     pmac,
     pmac_sim,
 )
-from bluefly.core import NamedDevices, SignalCollector, TmpFilenameScheme
+from bluefly.core import (
+    HDFDatasetResource,
+    HDFResource,
+    NamedDevices,
+    NotConnectedError,
+    RemainingPoints,
+    SignalCollector,
+    TmpFilenameScheme,
+)
 from bluefly.simprovider import SimProvider
 
 
@@ -29,7 +37,7 @@ async def test_fly_scan():
     set_bluesky_event_loop(asyncio.get_running_loop())
     async with SignalCollector(), NamedDevices(), TmpFilenameScheme():
         sim = SignalCollector.add_provider(sim=SimProvider(), set_default=True)
-        pmac1 = pmac.PMAC("BLxxI-MO-PMAC-01:")
+        pmac1 = pmac.PMAC("BLxxI-MO-PMAC-01:", batch_size=4)
         t1x = motor.MotorDevice(pmac.PMACRawMotor("BLxxI-MO-TABLE-01:X"))
         t1y = motor.MotorDevice(pmac.PMACRawMotor("BLxxI-MO-TABLE-01:Y"))
         t1z = motor.MotorDevice(pmac.PMACRawMotor("BLxxI-MO-TABLE-01:Z"))
@@ -53,48 +61,48 @@ async def test_fly_scan():
         duration=0.5,
     )
     scan.configure(dict(generator=generator))
-    with patch("bluefly.pmac.BATCH_SIZE", 4):
-        watcher = Mock()
-        done = Mock()
-        await scan.kickoff()
-        s = scan.complete()
-        s.watch(watcher)
-        s.add_callback(done)
-        assert not s.done
-        await asyncio.sleep(1.25)
-        watcher.assert_called_once_with(
-            name="scan",
-            current=1,
-            initial=0,
-            target=6,
-            unit="",
-            precision=0,
-            time_elapsed=pytest.approx(1.0, abs=0.2),
-        )
-        assert await t1x.motor.readback.get() == 2.0
-        scan.pause()
-        watcher.reset_mock()
-        assert not s.done
-        await asyncio.sleep(0.75)
-        assert s.done
-        assert not s.success
-        watcher.assert_not_called()
-        scan.resume()
-        assert not s.done
-        done.assert_not_called()
-        await asyncio.sleep(2.75)
-        assert s.done
-        assert s.success
-        assert await t1x.motor.readback.get() == 2.0
-        assert watcher.call_count == 3
-        assert [c[1]["current"] for c in watcher.call_args_list] == [2, 4, 6]
-        assert [c[1]["time_elapsed"] for c in watcher.call_args_list] == pytest.approx(
-            [3, 4, 4.5], abs=0.3
-        )
-        done.assert_called_once_with(s)
-        done.reset_mock()
-        s.add_callback(done)
-        done.assert_called_once_with(s)
+    watcher = Mock()
+    done = Mock()
+    await scan.kickoff()
+    s = scan.complete()
+    s.watch(watcher)
+    s.add_callback(done)
+    assert not s.done
+    await asyncio.sleep(1.25)
+    watcher.assert_called_once_with(
+        name="scan",
+        current=1,
+        initial=0,
+        target=6,
+        unit="",
+        precision=0,
+        time_elapsed=pytest.approx(1.0, abs=0.2),
+    )
+    assert await t1x.motor.readback.get() == 2.0
+    scan.pause()
+    watcher.reset_mock()
+    assert not s.done
+    # Wait for the pause to stop the hardware rather than a fixed time
+    await asyncio.wait_for(scan.wait_for_pause(), timeout=1)
+    assert s.done
+    assert not s.success
+    watcher.assert_not_called()
+    scan.resume()
+    assert not s.done
+    done.assert_not_called()
+    await asyncio.wait_for(s, timeout=3)
+    assert s.done
+    assert s.success
+    assert await t1x.motor.readback.get() == 2.0
+    assert watcher.call_count == 3
+    assert [c[1]["current"] for c in watcher.call_args_list] == [2, 4, 6]
+    assert [c[1]["time_elapsed"] for c in watcher.call_args_list] == pytest.approx(
+        [2.25, 3.25, 3.75], abs=0.3
+    )
+    done.assert_called_once_with(s)
+    done.reset_mock()
+    s.add_callback(done)
+    done.assert_called_once_with(s)
 
 
 @pytest.mark.asyncio
@@ -114,7 +122,7 @@ async def test_motor_moving():
     await asyncio.sleep(0.3)
     assert not s.done
     assert m.call_count == 3
-    await asyncio.sleep(0.3)
+    await asyncio.wait_for(s, timeout=0.5)
     assert s.done
     assert m.call_count == 6
     assert m.call_args_list[1] == call(
@@ -129,6 +137,8 @@ async def test_motor_moving():
     await x.trigger()
     assert x.read()["x"]["value"] == 0.55
     assert x.describe()["x"]["source"] == "BLxxI-MO-TABLE-01:X.readback"
+    x.describe()["x"]["source"] = "modified by caller"
+    assert x.describe()["x"]["source"] == "BLxxI-MO-TABLE-01:X.readback"
     assert x.read_configuration() == {}
     assert x.describe_configuration() == {}
     s = x.set(1.5)
@@ -160,9 +170,9 @@ async def test_areadetector_step_scan():
 
     assert det.stage() == [det]
     det.configure(dict(exposure=1.0))
-    now = time.time()
+    now = time.monotonic()
     await det.trigger()
-    assert time.time() - now == pytest.approx(1.0, abs=0.1)
+    assert time.monotonic() - now == pytest.approx(1.0, abs=0.1)
     assert det.read()["det_sum"]["value"] == 819984.0
     docs = list(det.collect_asset_docs())
     assert docs == [
@@ -185,11 +195,17 @@ async def test_areadetector_step_scan():
     assert docs[1][1]["resource"] == docs[0][1]["uid"]
     assert docs[1][1]["datum_id"] == docs[0][1]["uid"] + "/0"
     fname = os.path.join(docs[0][1]["root"], docs[0][1]["resource_path"])
-    f = h5py.File(fname, "r")
-    assert f["/entry/sum"].shape == (1, 1, 1)
-    assert f["/entry/data/data"].shape == (1, 240, 320)
-    assert f["/entry/sum"][0][0][0] == 819984.0
-    assert np.sum(f["/entry/data/data"][0]) == 819984.0
+    # The sim writes in SWMR mode, so read it the same way
+    f = h5py.File(fname, "r", libver="latest", swmr=True)
+    # Look the datasets up once rather than by path for every assertion
+    sum_ds, data_ds = f["/entry/sum"], f["/entry/data/data"]
+    assert sum_ds.shape == (1, 1, 1)
+    assert data_ds.shape == (1, 240, 320)
+    assert sum_ds[0, 0, 0] == 819984.0
+    # Read each frame into the same buffer rather than making a new array
+    frame = np.empty(data_ds.shape[1:], data_ds.dtype)
+    data_ds.read_direct(frame, np.s_[0])
+    assert frame.sum() == 819984.0
     await x.set(3)
     await det.trigger()
     assert det.read()["det_sum"]["value"] == 9726824.0
@@ -201,11 +217,235 @@ async def test_areadetector_step_scan():
         )
     ]
     assert docs2[0][1]["datum_id"] == docs[0][1]["uid"] + "/1"
-    assert f["/entry/sum"].shape == (2, 1, 1)
-    assert f["/entry/data/data"].shape == (2, 240, 320)
-    assert f["/entry/sum"][1][0][0] == 9726824.0
-    assert np.sum(f["/entry/data/data"][1]) == 9726824.0
+    sum_ds.refresh()
+    data_ds.refresh()
+    assert sum_ds.shape == (2, 1, 1)
+    assert data_ds.shape == (2, 240, 320)
+    assert sum_ds[1, 0, 0] == 9726824.0
+    data_ds.read_direct(frame, np.s_[1])
+    assert frame.sum() == 9726824.0
     assert det.unstage() == [det]
-    # Wait for HDF file to be closed, can't actually check this, but it stops
+    # Wait for the HDF file to be closed, otherwise we get
     # "Task was destroyed but it is pending!" messages
-    await asyncio.sleep(0.5)
+    await det.wait_for_unstage()
+
+
+@pytest.mark.asyncio
+async def test_keep_filling_trajectory_errors():
+    async with SignalCollector():
+        sim = SignalCollector.add_provider(sim=SimProvider(), set_default=True)
+        pmac1 = pmac.PMAC("BLxxI-MO-PMAC-01:")
+    traj = pmac1.traj
+    generator = CompoundGenerator([LineGenerator("x", "mm", 0, 1, 10)], duration=0.1)
+    generator.prepare()
+
+    def make_tracker():
+        points = RemainingPoints(generator.get_points(0, generator.size), 0.1, 0)
+        tracker = pmac.TrajectoryTracker(points, dict(x="a"), batch_size=2)
+        # As if build_initial_trajectory had sent the first batch
+        tracker.get_next_batch()
+        return tracker
+
+    @sim.on_call(traj.execute)
+    async def do_execute():
+        sim.set_value(traj.execute_status, "Error")
+        sim.set_value(traj.execute_message, "Following error")
+
+    # Execute finishing with points still to send stops the filling
+    sim.set_value(traj.points_scanned, 0)
+    with pytest.raises(ValueError, match="Following error"):
+        await pmac.keep_filling_trajectory(pmac1, make_tracker())
+
+    # An error watching points_scanned is raised rather than pushing a batch
+    async def bad_refill(traj, tracker):
+        raise RuntimeError("Lost points_scanned")
+
+    with patch("bluefly.pmac.wait_for_refill", bad_refill):
+        with pytest.raises(RuntimeError, match="Lost points_scanned"):
+            await pmac.keep_filling_trajectory(pmac1, make_tracker())
+
+
+def test_trajectory_batches_not_overwritten():
+    generator = CompoundGenerator([LineGenerator("x", "mm", 0, 1, 4)], duration=0.1)
+    generator.prepare()
+    points = RemainingPoints(generator.get_points(0, generator.size), 0.1, 0)
+    tracker = pmac.TrajectoryTracker(points, dict(x="a"), batch_size=2)
+    first = tracker.get_next_batch()
+    second = tracker.get_next_batch()
+    # A batch that has already been set must not change when the next is made
+    assert list(first.positions["a"]) == [0, 1 / 3]
+    assert list(second.positions["a"]) == [2 / 3, 1]
+
+
+@pytest.mark.asyncio
+async def test_find_cs():
+    async with SignalCollector():
+        sim = SignalCollector.add_provider(sim=SimProvider(), set_default=True)
+        pmac1 = pmac.PMAC("BLxxI-MO-PMAC-01:")
+    cs1, cs2, cs3 = pmac1.cs_list[:3]
+    sim.set_value(cs1.port, "CS1")
+    sim.set_value(cs3.port, "CS3")
+    # Not all PMACs implement all CS
+    missing = Mock()
+    missing.port.get = AsyncMock(side_effect=NotConnectedError(cs2.port.source))
+    pmac1.cs_list[1] = missing
+    assert await pmac.find_cs(pmac1, "CS3") is cs3
+    with pytest.raises(ValueError, match="No CS given for 'CS2'"):
+        await pmac.find_cs(pmac1, "CS2")
+    # Moving the port to another CS is noticed rather than using the old one
+    sim.set_value(cs1.port, "CS3")
+    sim.set_value(cs3.port, "CS1")
+    assert await pmac.find_cs(pmac1, "CS3") is cs1
+    # Any other error is raised
+    missing.port.get.side_effect = RuntimeError("IOC crashed")
+    with pytest.raises(RuntimeError, match="IOC crashed"):
+        await pmac.find_cs(pmac1, "CS2")
+
+
+class FakeFileLogic(detector.DetectorLogic):
+    """Detector that writes a file with num zero sums up front"""
+
+    def __init__(self, num: int):
+        self.num = num
+
+    async def open(self, file_prefix: str) -> HDFResource:
+        resource = HDFResource(
+            data=[HDFDatasetResource()],
+            summary=HDFDatasetResource("sum", "/entry/sum"),
+            file_path=file_prefix + ".h5",
+        )
+        with h5py.File(resource.file_path, "w") as f:
+            for ds in resource.data + [resource.summary]:
+                f.create_dataset(ds.dataset_path, shape=(self.num, 1, 1))
+        return resource
+
+    async def get_deadtime(self, exposure: float) -> float:
+        return 0
+
+    async def arm(self, num, offset, mode, exposure):
+        pass
+
+    async def collect(self, num, callback):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class StepFlyLogic(fly.FlyLogic):
+    """Fly logic that reports the steps put on a queue by the test"""
+
+    def __init__(self):
+        self.steps: asyncio.Queue = asyncio.Queue()
+
+    async def scan(self, detectors, points, offset, callback):
+        step = 0
+        while step < points.remaining:
+            step = await self.steps.get()
+            for det in detectors:
+                callback(det.name, step)
+
+    async def stop(self, detectors):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_fly_watchers_throttled():
+    set_bluesky_event_loop(asyncio.get_running_loop())
+    num = 1000
+    async with NamedDevices(), TmpFilenameScheme():
+        det = detector.DetectorDevice(FakeFileLogic(num))
+        logic = StepFlyLogic()
+        scan = fly.FlyDevice([det], logic)
+    generator = CompoundGenerator([LineGenerator("x", "mm", 0, 1, num)], duration=0.01)
+    scan.configure(dict(generator=generator))
+    watcher = Mock()
+
+    def currents():
+        return [c[1]["current"] for c in watcher.call_args_list]
+
+    with patch("bluefly.fly.WATCHER_UPDATE_PERIOD", 0.2):
+        await scan.kickoff()
+        s = scan.complete()
+        s.watch(watcher)
+        # The first step is sent straight away
+        logic.steps.put_nowait(10)
+        await asyncio.sleep(0.05)
+        assert currents() == [10]
+        # Steps within the period are held back
+        logic.steps.put_nowait(20)
+        await asyncio.sleep(0.01)
+        logic.steps.put_nowait(30)
+        await asyncio.sleep(0.05)
+        assert watcher.call_count == 1
+        # Then the latest is sent when the period is up, even though no more
+        # steps have arrived
+        await asyncio.sleep(0.15)
+        assert currents() == [10, 30]
+        # Once the period is up, steps that don't change the percentage are
+        # dropped rather than sent later
+        await asyncio.sleep(0.25)
+        logic.steps.put_nowait(35)
+        await asyncio.sleep(0.3)
+        assert currents() == [10, 30]
+        # But a new percentage is sent straight away
+        logic.steps.put_nowait(40)
+        await asyncio.sleep(0.05)
+        assert currents() == [10, 30, 40]
+        # Pausing sends anything held back rather than leaving it stale
+        logic.steps.put_nowait(50)
+        await asyncio.sleep(0.01)
+        assert watcher.call_count == 3
+        scan.pause()
+        await asyncio.wait_for(scan.wait_for_pause(), timeout=1)
+        assert currents() == [10, 30, 40, 50]
+        # And the final step is always sent, the logic counts from the resume
+        scan.resume()
+        logic.steps.put_nowait(num - 50)
+        await asyncio.wait_for(s, timeout=1)
+        assert currents() == [10, 30, 40, 50, num]
+    assert scan.unstage() == [scan]
+    await scan.wait_for_unstage()
+
+
+@pytest.mark.asyncio
+async def test_fly_wait_for_collections():
+    num = 6
+    async with NamedDevices(), TmpFilenameScheme():
+        det = detector.DetectorDevice(FakeFileLogic(num))
+        logic = StepFlyLogic()
+        scan = fly.FlyDevice([det], logic)
+    generator = CompoundGenerator([LineGenerator("x", "mm", 0, 1, num)], duration=0.01)
+    scan.configure(dict(generator=generator))
+    await scan.kickoff()
+    # Nothing is scanning, so there is nothing to wait for
+    await asyncio.wait_for(scan.wait_for_collections(), timeout=0.1)
+    s = scan.complete()
+    await asyncio.sleep(0.01)
+    waiter = asyncio.ensure_future(scan.wait_for_collections())
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+    # New points wake the waiter, and can then be collected
+    logic.steps.put_nowait(2)
+    await asyncio.wait_for(waiter, timeout=1)
+    assert [d["data"]["x"] for d in scan.collect()] == [0, 0.2]
+    # The scan stopping wakes the waiter too
+    waiter = asyncio.ensure_future(scan.wait_for_collections())
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+    scan.pause()
+    await asyncio.wait_for(waiter, timeout=1)
+    await asyncio.wait_for(scan.wait_for_pause(), timeout=1)
+    assert s.done
+    assert list(scan.collect()) == []
+
+
+def test_dumps_without_orjson():
+    d = dict(generators=[dict(start=[0.0], size=3)], duration=0.5)
+    with patch("bluefly.fly.orjson", None):
+        assert (
+            fly._dumps(d) == '{"generators":[{"start":[0.0],"size":3}],"duration":0.5}'
+        )